@@ -1,9 +1,62 @@
 import speech_recognition as sr
 import pyttsx3
 import json
+import os
 import re
 from datetime import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import vosk
+except ImportError:  # offline recognition is optional - use Google instead
+    vosk = None
+
+# Directory holding the Vosk model (e.g. an unpacked vosk-model-small-en-us), next to this script
+VOSK_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+
+class _DigitsOnly(dict):
+    """str.translate table that keeps ASCII digits and drops every other character."""
+    def __missing__(self, key):
+        return None
+
+
+# Translation table for stripping non-digits (ASCII entries prebuilt, rest via __missing__)
+_KEEP_DIGITS = _DigitsOnly({c: (c if 48 <= c <= 57 else None) for c in range(128)})
+
+# Precompiled patterns used by the validators
+_ALPHA_RE = re.compile(r'[a-zA-Z]')
+
+# Keywords recognised as consent answers (matched against whole words)
+_YES = frozenset({"yes", "yeah", "sure", "yep", "yup", "affirmative"})
+_NO = frozenset({"no", "nope", "nah"})
+_NEGATIONS = frozenset({"not", "never", "dont", "don"})  # "don't" splits into "don", "t"
+_WORD_SPLIT = re.compile(r'\W+')
+
+# Spoken digit words, and a Vosk grammar restricted to them for numeric fields
+_DIGIT_WORDS = {
+    "zero": "0", "oh": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+}
+_DIGIT_GRAMMAR = json.dumps(list(_DIGIT_WORDS) + ["[unk]"])
+
+
+def _to_json(data):
+    """Serialize data as 2-space indented JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+
+def _words_to_digits(text):
+    """Replace spoken digit words ("nine eight ...") with digits."""
+    return " ".join(_DIGIT_WORDS.get(word, word) for word in text.lower().split())
 
 
 class KYCVoiceBot:
@@ -11,6 +64,22 @@ class KYCVoiceBot:
         """Initialize the voice bot with speech recognition and TTS engines."""
         self.recognizer = sr.Recognizer()
         
+        # Single TTS engine reused for every prompt (None until init succeeds)
+        try:
+            self._tts = self._init_tts()
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            self._tts = None
+        self._warm_tts()
+        
+        # Session microphone, opened once in the background while the bot is speaking
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._mic_future = None
+        self._source = None
+        
+        # Ambient noise calibration is done once per session
+        self._calibrated = False
+        
         # KYC data storage
         self.kyc_data = {
             "name": "",
@@ -23,37 +92,118 @@ class KYCVoiceBot:
         # Maximum retry attempts
         self.max_retries = 2
         
+        # Local recognition model, loaded once (None falls back to Google)
+        self._vosk_model = self._load_vosk()
+        
         print("Voice bot initialized successfully")
+        if self._vosk_model is not None:
+            print("Using OFFLINE speech recognition (Vosk)")
+    
+    def _load_vosk(self):
+        """Load the Vosk model if vosk is installed and the model directory exists."""
+        if vosk is None or not os.path.isdir(VOSK_MODEL_PATH):
+            return None
+        try:
+            return vosk.Model(VOSK_MODEL_PATH)
+        except Exception as e:
+            print(f"Could not load Vosk model: {e}")
+            return None
+    
+    def _init_tts(self):
+        """Create and configure a pyttsx3 engine."""
+        engine = pyttsx3.init()
+        engine.setProperty('rate', 150)
+        engine.setProperty('volume', 0.9)
+        return engine
+    
+    def _warm_tts(self):
+        """Run a silent utterance so the first real prompt doesn't pay voice setup cost."""
+        if self._tts is None:
+            return
+        try:
+            self._tts.say("")
+            self._tts.runAndWait()
+        except Exception as e:
+            print(f"TTS warm-up failed: {e}")
     
     def speak(self, text):
-        """Convert text to speech - creates fresh engine each time to avoid Windows bug."""
+        """Convert text to speech using the cached engine."""
         print(f"\nBot: {text}")
         
+        # Open the session mic in the background during the first prompt
+        if self._source is None and self._mic_future is None:
+            self._mic_future = self._executor.submit(self._open_mic)
+        
         try:
-            # Create a fresh engine for each speech
-            engine = pyttsx3.init()
-            engine.setProperty('rate', 150)
-            engine.setProperty('volume', 0.9)
-            engine.say(text)
-            engine.runAndWait()
-            engine.stop()
-            del engine  # Clean up
+            # Lazy init if the engine couldn't be created earlier - a failure here is not retried
+            if self._tts is None:
+                self._tts = self._init_tts()
+            try:
+                self._tts.say(text)
+                self._tts.runAndWait()
+            except Exception:
+                # Windows SAPI5 engine can get stuck after a run - re-init once and retry
+                self._tts = None
+                self._tts = self._init_tts()
+                self._tts.say(text)
+                self._tts.runAndWait()
             time.sleep(0.3)  # Small pause between speeches
         except Exception as e:
             print(f"TTS Error: {e}")
             print("(Please read the text above)")
     
-    def listen(self):
-        """Capture user speech and convert to text."""
-        with sr.Microphone() as source:
+    def _open_mic(self):
+        """Open a microphone stream and return the entered source."""
+        # 16 kHz is all the recognizer needs - keeps the uploaded FLAC small
+        mic = sr.Microphone(sample_rate=16000)
+        source = mic.__enter__()
+        # Keep the stream paused until listen() so it doesn't buffer the bot's own voice
+        source.stream.pyaudio_stream.stop_stream()
+        return source
+    
+    def _session_mic(self):
+        """Return the session microphone, opening it if needed."""
+        if self._source is None:
+            if self._mic_future is not None:
+                future, self._mic_future = self._mic_future, None
+                self._source = future.result()
+            else:
+                self._source = self._open_mic()
+        return self._source
+    
+    def _recognize_vosk(self, audio, grammar=None):
+        """Transcribe captured audio with the local Vosk model."""
+        if grammar:
+            recognizer = vosk.KaldiRecognizer(self._vosk_model, 16000, grammar)
+        else:
+            recognizer = vosk.KaldiRecognizer(self._vosk_model, 16000)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=16000, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        if not text or text == "[unk]":
+            raise sr.UnknownValueError()
+        return text
+    
+    def listen(self, grammar=None, phrase_time_limit=10, timeout=10):
+        """Capture user speech and convert to text (grammar constrains offline Vosk recognition)."""
+        source = self._session_mic()
+        stream = source.stream.pyaudio_stream
+        if stream.is_stopped():
+            stream.start_stream()
+        
+        try:
             print("\n[LISTENING] (speak now)")
-            # Adjust for ambient noise
-            self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+            # Adjust for ambient noise (first listen only - dynamic threshold tracks drift after that)
+            if not self._calibrated:
+                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                self._calibrated = True
             
             try:
-                audio = self.recognizer.listen(source, timeout=10, phrase_time_limit=10)
+                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
                 print("Processing...")
-                text = self.recognizer.recognize_google(audio)
+                if self._vosk_model is not None:
+                    text = self._recognize_vosk(audio, grammar)
+                else:
+                    text = self.recognizer.recognize_google(audio)
                 print(f"You: {text}")
                 return text.strip()
             except sr.WaitTimeoutError:
@@ -65,148 +215,168 @@ class KYCVoiceBot:
             except sr.RequestError as e:
                 print(f"Speech recognition error: {e}")
                 return None
+        finally:
+            stream.stop_stream()
+    
+    def close(self):
+        """Release the session microphone and wait for the background worker to finish."""
+        try:
+            if self._mic_future is not None or self._source is not None:
+                self._session_mic().__exit__(None, None, None)
+        except Exception as e:
+            print(f"Microphone error: {e}")
+        finally:
+            self._source = None
+            # Waits for a pending background save
+            self._executor.shutdown(wait=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def recalibrate(self):
+        """Force ambient noise calibration on the next listen."""
+        self._calibrated = False
     
     def validate_name(self, name):
         """Validate name is non-empty and contains only letters and spaces."""
         if not name or len(name.strip()) < 2:
             return False
         # Checking if name contains at least some alphabetic characters
-        if not re.search(r'[a-zA-Z]', name):
+        if not _ALPHA_RE.search(name):
             return False
         return True
     
     def validate_phone(self, phone):
         """Validate phone number is exactly 10 digits."""
-        # Remove spaces and common words
-        phone_cleaned = re.sub(r'[^\d]', '', phone)
-        return len(phone_cleaned) == 10 and phone_cleaned.isdigit()
+        # Strip everything but digits - what's left is all digits, so only the length matters
+        phone_cleaned = phone.translate(_KEEP_DIGITS)
+        return len(phone_cleaned) == 10
     
     def validate_pan(self, pan):
         """Validate PAN is 10 alphanumeric characters (format: ABCDE1234F)."""
         # Remove spaces
         pan_cleaned = pan.replace(" ", "").upper()
-        # PAN format: 5 letters, 4 digits, 1 letter
-        pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]$'
-        return len(pan_cleaned) == 10 and bool(re.match(pattern, pan_cleaned))
+        # PAN format: 5 letters, 4 digits, 1 letter (isascii keeps isalpha/isdigit to A-Z/0-9)
+        return (
+            len(pan_cleaned) == 10
+            and pan_cleaned.isascii()
+            and pan_cleaned[:5].isalpha()
+            and pan_cleaned[5:9].isdigit()
+            and pan_cleaned[9].isalpha()
+        )
     
     def extract_phone(self, text):
         """Extract 10-digit phone number from text."""
-        digits = re.sub(r'[^\d]', '', text)
+        digits = _words_to_digits(text).translate(_KEEP_DIGITS)
         if len(digits) >= 10:
             return digits[:10]
         return digits
     
     def extract_pan(self, text):
         """Extract PAN from text."""
-        # Remove spaces and convert to uppercase
-        return text.replace(" ", "").upper()
+        # Rebuild word by word so spoken digits only become digits in the numeric
+        # positions 5-8 - elsewhere "oh" is the letter O
+        pan = ""
+        for word in text.lower().split():
+            if 5 <= len(pan) <= 8 and word in _DIGIT_WORDS:
+                pan += _DIGIT_WORDS[word]
+            elif word == "oh":
+                pan += "o"
+            else:
+                pan += word
+        return pan.upper()
     
-    def get_input_with_retry(self, prompt, validation_func, extract_func=None, field_name="input"):
+    def get_input_with_retry(self, prompt, validation_func, extract_func=None, field_name="input", grammar=None,
+                             phrase_time_limit=10):
         """Get user input with validation and retry logic"""
-        # First attempt - use full prompt
-        self.speak(prompt)
-        user_input = self.listen()
+        speak, listen = self.speak, self.listen
+        # Reprompts used after consecutive missed inputs
+        missed_prompts = (
+            "I didn't catch that. Please say it again.",
+            "I'm still having trouble hearing you. Let's try one more time.",
+        )
+        missed = 0
+        user_input = None
         
-        if user_input is None:
-            # First retry - friendly reprompt
-            self.speak("I didn't catch that. Please say it again.")
-            user_input = self.listen()
+        for attempt in range(self.max_retries + 1):
+            speak(prompt)
+            user_input = listen(grammar, phrase_time_limit)
             
             if user_input is None:
-                # Second retry - more encouraging
-                self.speak("I'm still having trouble hearing you. Let's try one more time.")
-                user_input = self.listen()
-                
-                if user_input is None:
-                    # Final failure
-                    self.speak(f"I'm sorry, I couldn't hear your {field_name}.")
-                    return None
-        
-        # Now we have input, validate it
-        processed_input = extract_func(user_input) if extract_func else user_input
-        
-        if validation_func(processed_input):
-            return processed_input
-        
-        # Validation failed - retry with shorter prompts
-        for attempt in range(self.max_retries):
-            self.speak(f"That {field_name} doesn't seem valid. Please try again.")
-            user_input = self.listen()
-            
-            if user_input is None:
-                if attempt < self.max_retries - 1:
-                    self.speak("I didn't catch that. Let's try again.")
-                    continue
-                else:
-                    self.speak("I'm sorry, I couldn't hear your response.")
-                    return None
+                prompt = missed_prompts[min(missed, len(missed_prompts) - 1)]
+                missed += 1
+                continue
             
+            missed = 0
             processed_input = extract_func(user_input) if extract_func else user_input
             
             if validation_func(processed_input):
                 return processed_input
+            
+            # Validation failed - retry with a shorter prompt
+            prompt = f"That {field_name} doesn't seem valid. Please try again."
         
         # All retries exhausted
-        self.speak(f"I was unable to verify your {field_name}.")
+        if user_input is None:
+            speak(f"I'm sorry, I couldn't hear your {field_name}.")
+        else:
+            speak(f"I was unable to verify your {field_name}.")
         return None
     
-    def get_consent(self):
-        """Get user consent with yes/no validation"""
-        # First attempt
-        self.speak("Do you consent to this KYC verification? Please say yes or no.")
-        response = self.listen()
-        
-        if response is None:
-            # First retry
-            self.speak("I didn't catch that. Do you consent? Say yes or no.")
-            response = self.listen()
-            
-            if response is None:
-                # Second retry
-                self.speak("Please say yes or no for consent.")
-                response = self.listen()
-                
-                if response is None:
-                    # Final failure
-                    self.speak("I couldn't get your consent. Verification cannot proceed.")
-                    return False
-        
-        # Check the response
-        response_lower = response.lower()
-        
-        if "yes" in response_lower or "yeah" in response_lower or "sure" in response_lower:
+    def _classify_consent(self, response):
+        """Return True for yes, False for no, None if the response is neither."""
+        words = set(_WORD_SPLIT.split(response.lower()))
+        said_yes = not words.isdisjoint(_YES)
+        said_no = not words.isdisjoint(_NO)
+        negated = not words.isdisjoint(_NEGATIONS)
+        # Mixed ("no yes") or negated ("not sure") answers are ambiguous - ask again
+        if said_yes and (said_no or negated):
+            return None
+        # A bare negation ("I do not consent", "not really") is a refusal
+        said_no = said_no or negated
+        if said_yes:
             return True
-        elif "no" in response_lower or "nope" in response_lower:
-            self.speak("You have declined consent. Verification cannot proceed.")
+        if said_no:
             return False
-        
-        # If Invalid response - retry with shorter prompts
-        for attempt in range(self.max_retries):
-            self.speak("Please say yes or no.")
-            response = self.listen()
+        return None
+    
+    def get_consent(self):
+        """Get user consent with yes/no validation"""
+        speak, listen = self.speak, self.listen
+        prompt = "Do you consent to this KYC verification? Please say yes or no."
+        response = None
+        
+        for attempt in range(self.max_retries + 1):
+            speak(prompt)
+            # Yes/no answers are short and immediate - don't wait or record for long
+            response = listen(phrase_time_limit=3, timeout=5)
             
             if response is None:
-                if attempt < self.max_retries - 1:
-                    self.speak("I didn't hear you. Say yes or no.")
-                    continue
-                else:
-                    self.speak("I couldn't get your consent. Verification cannot proceed.")
-                    return False
+                prompt = "I didn't catch that. Do you consent? Say yes or no."
+                continue
             
-            response_lower = response.lower()
-            
-            if "yes" in response_lower or "yeah" in response_lower or "sure" in response_lower:
+            consent = self._classify_consent(response)
+            if consent is True:
                 return True
-            elif "no" in response_lower or "nope" in response_lower:
-                self.speak("You have declined consent. Verification cannot proceed.")
+            if consent is False:
+                speak("You have declined consent. Verification cannot proceed.")
                 return False
+            
+            # Invalid response - retry with a shorter prompt
+            prompt = "Please say yes or no."
         
-        # All retries exhausted with invalid responses
-        self.speak("I couldn't understand your response. Verification cannot proceed.")
+        # All retries exhausted
+        if response is None:
+            speak("I couldn't get your consent. Verification cannot proceed.")
+        else:
+            speak("I couldn't understand your response. Verification cannot proceed.")
         return False
     
-    def run_kyc_session(self):
-        """Main KYC verification flow."""
+    def run_kyc_session(self, filename="kyc_session.json"):
+        """Main KYC verification flow - on success the data is saved to filename."""
         print("\n" + "="*50)
         print("DECENTRO KYC VOICE VERIFICATION")
         print("="*50 + "\n")
@@ -218,7 +388,8 @@ class KYCVoiceBot:
         name = self.get_input_with_retry(
             "May I have your full name please?",
             self.validate_name,
-            field_name="name"
+            field_name="name",
+            phrase_time_limit=8
         )
         
         if name:
@@ -232,7 +403,9 @@ class KYCVoiceBot:
             "Thank you. Now, please provide your 10-digit mobile number.",
             self.validate_phone,
             self.extract_phone,
-            field_name="phone number"
+            field_name="phone number",
+            grammar=_DIGIT_GRAMMAR,
+            phrase_time_limit=8
         )
         
         if phone:
@@ -246,7 +419,8 @@ class KYCVoiceBot:
             "Great. Now, please say your PAN number. That's 10 characters: 5 letters, 4 numbers, and 1 letter.",
             self.validate_pan,
             self.extract_pan,
-            field_name="PAN"
+            field_name="PAN",
+            phrase_time_limit=10
         )
         
         if pan:
@@ -263,19 +437,21 @@ class KYCVoiceBot:
             return False
         
         # Step 5: Summary and Confirmation
-        self.speak("Thank you. Let me confirm your details.")
-        time.sleep(0.5)
-        self.speak(f"Name: {self.kyc_data['name']}")
-        time.sleep(0.5)
-        self.speak(f"Phone: {self.kyc_data['phone']}")
-        time.sleep(0.5)
-        self.speak(f"PAN: {self.kyc_data['pan']}")
-        time.sleep(0.5)
-        self.speak("Consent: Provided")
+        # One utterance - sentence breaks give the pauses between fields
+        self.speak(
+            "Thank you. Let me confirm your details. "
+            f"Name: {self.kyc_data['name']}. "
+            f"Phone: {self.kyc_data['phone']}. "
+            f"PAN: {self.kyc_data['pan']}. "
+            "Consent: Provided."
+        )
         
         # Add timestamp
         self.kyc_data["timestamp"] = datetime.now().isoformat()
         
+        # Save in the background while the thank you message plays (close() waits for it)
+        self._executor.submit(self.save_to_json, filename)
+        
         # Final confirmation & thank you message
         self.speak("Your KYC verification is complete. Thank you for using Decentro services.")
         
@@ -284,8 +460,8 @@ class KYCVoiceBot:
     def save_to_json(self, filename="kyc_session.json"):
         """Saving KYC data to JSON file."""
         try:
-            with open(filename, 'w') as f:
-                json.dump(self.kyc_data, f, indent=2)
+            with open(filename, 'wb') as f:
+                f.write(_to_json(self.kyc_data))
             print(f"\nKYC data saved to {filename}")
             return True
         except Exception as e:
@@ -305,26 +481,26 @@ def main():
     print("5. Turn up your volume if you can't hear the bot")
     print("="*50 + "\n")
     
-    input("Press Enter when you're ready to start...")
-    
+    # Build (and warm up) the bot while the user reads the instructions
     bot = KYCVoiceBot()
     
+    input("Press Enter when you're ready to start...")
+    
     # Run the KYC session
-    success = bot.run_kyc_session()
+    with bot:
+        # Data is saved to JSON inside the session, overlapped with the closing message
+        success = bot.run_kyc_session("kyc_session.json")
     
     if success:
-        # Save data to JSON
-        bot.save_to_json("kyc_session.json")
-        
         # Display final data
         print("\n" + "="*50)
         print("KYC SESSION DATA")
         print("="*50)
-        print(json.dumps(bot.kyc_data, indent=2))
+        print(_to_json(bot.kyc_data).decode())
     else:
         print("\nKYC verification was not completed successfully.")
         print("Partial data collected:")
-        print(json.dumps(bot.kyc_data, indent=2))
+        print(_to_json(bot.kyc_data).decode())
 
 
 if __name__ == "__main__":
@@ -372,8 +548,6 @@ if __name__ == "__main__":
 #             engine.setProperty('volume', 0.9)
 #             engine.say(text)
 #             engine.runAndWait()
-#             engine.stop()
-#             del engine  # Clean up
 #             time.sleep(0.3)  # Small pause between speeches
 #         except Exception as e:
 #             print(f"TTS Error: {e}")